@@ -119,6 +119,23 @@ class BuildIsalExt(build_ext):
         super().build_extension(ext)
 
 
+def available_cpu_count() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        cpu_count = len(os.sched_getaffinity(0))
+    else:  # sched_getaffinity not available on all platforms
+        cpu_count = os.cpu_count() or 1  # os.cpu_count() can return None
+    # Containers can limit CPU time with a cgroup v2 quota while all the host
+    # CPUs are still reported as available. Running more make jobs than the
+    # quota allows only adds contention.
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            cpu_count = min(cpu_count, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):  # No cgroup v2 or unexpected format.
+        pass
+    return cpu_count
+
+
 # Use a cache to prevent isa-l from being build twice. According to the
 # functools docs lru_cache with maxsize None is faster. The shortcut called
 # 'cache' is only available from python 3.9 onwards.
@@ -148,10 +165,7 @@ def build_isa_l(compiler_command: str, compiler_options: str):
         # The nmake file has CLFAGS_REL for all the compiler options.
         # This is added to CFLAGS with all the necessary include options.
         build_env["CFLAGS_REL"] = compiler_options
-    if hasattr(os, "sched_getaffinity"):
-        cpu_count = len(os.sched_getaffinity(0))
-    else:  # sched_getaffinity not available on all platforms
-        cpu_count = os.cpu_count() or 1  # os.cpu_count() can return None
+    cpu_count = available_cpu_count()
     run_args = dict(cwd=build_dir, env=build_env)
     if SYSTEM_IS_UNIX:
         subprocess.run(os.path.join(build_dir, "autogen.sh"), **run_args)
@@ -25,6 +25,7 @@ import argparse
 import gzip
 import io
 import os
+import re
 import struct
 import sys
 import time
@@ -41,16 +42,45 @@ _COMPRESS_LEVEL_TRADEOFF = isal_zlib.ISAL_DEFAULT_COMPRESSION
 _COMPRESS_LEVEL_BEST = isal_zlib.ISAL_BEST_COMPRESSION
 
 #: The amount of data that is read in at once when decompressing a file.
-#: Increasing this value may increase performance.
+#: Increasing this value may increase performance for large single-member
+#: files. Files consisting of many small members may become slower, as the
+#: read data that is left over at the end of each member is copied.
 READ_BUFFER_SIZE = io.DEFAULT_BUFFER_SIZE
 
+# Small writes are gathered up to this size before they are compressed. This
+# saves a compress and crc32 call for every small write.
+_WRITE_BUFFER_SIZE = 256 * 1024
+
 FTEXT, FHCRC, FEXTRA, FNAME, FCOMMENT = 1, 2, 4, 8, 16
 
+# Precompiled structs for the fixed parts of the gzip header and trailer.
+_SIMPLE_GZIP_HEADER = struct.Struct("<BBBBLBB")
+_GZIP_HEADER_START = struct.Struct("<HBB")
+_GZIP_TRAILER = struct.Struct("<II")
+
+# Used to skip the null byte padding between gzip members.
+_NON_NULL_BYTE = re.compile(rb"[^\x00]")
+
+_EOF_ERROR_MESSAGE = ("Compressed file ended before the end-of-stream "
+                      "marker was reached")
+
 try:
     BadGzipFile = gzip.BadGzipFile  # type: ignore
 except AttributeError:  # Versions lower than 3.8 do not have BadGzipFile
     BadGzipFile = OSError
 
+# Python 3.9 added a `compresslevel` parameter to write gzip header.
+# This only determines the value of one extra flag. Because this change
+# was backported to 3.7 and 3.8 in later point versions, the attributes
+# of the function should be checked before trying to use the
+# compresslevel parameter. This only needs to be checked once, rather than
+# every time a file is opened.
+_GZIP_HEADER_HAS_COMPRESSLEVEL = (
+    "compresslevel" in
+    gzip.GzipFile._write_gzip_header.__code__.co_varnames  # type: ignore
+    and hasattr(gzip, "_COMPRESS_LEVEL_FAST")
+    and hasattr(gzip, "_COMPRESS_LEVEL_TRADEOFF"))
+
 
 # The open method was copied from the CPython source with minor adjustments.
 def open(filename, mode="rb", compresslevel=_COMPRESS_LEVEL_TRADEOFF,
@@ -87,13 +117,17 @@ def open(filename, mode="rb", compresslevel=_COMPRESS_LEVEL_TRADEOFF,
             raise ValueError("Argument 'newline' not supported in binary mode")
 
     gz_mode = mode.replace("t", "")
-    # __fspath__ method is os.PathLike
-    if isinstance(filename, (str, bytes)) or hasattr(filename, "__fspath__"):
-        binary_file = IGzipFile(filename, gz_mode, compresslevel)
-    elif hasattr(filename, "read") or hasattr(filename, "write"):
-        binary_file = IGzipFile(None, gz_mode, compresslevel, filename)
+    try:
+        # Accepts str, bytes and os.PathLike objects.
+        filename = os.fspath(filename)
+    except TypeError:
+        if hasattr(filename, "read") or hasattr(filename, "write"):
+            binary_file = IGzipFile(None, gz_mode, compresslevel, filename)
+        else:
+            raise TypeError("filename must be a str or bytes object, "
+                            "or a file") from None
     else:
-        raise TypeError("filename must be a str or bytes object, or a file")
+        binary_file = IGzipFile(filename, gz_mode, compresslevel)
 
     if "t" in mode:
         return io.TextIOWrapper(binary_file, encoding, errors, newline)
@@ -155,6 +189,7 @@ class IGzipFile(gzip.GzipFile):
                                                   -isal_zlib.MAX_WBITS,
                                                   isal_zlib.DEF_MEM_LEVEL,
                                                   0)
+            self._write_buffer = bytearray()
         if self.mode == gzip.READ:
             raw = _IGzipReader(self.fileobj)
             self._buffer = io.BufferedReader(raw)
@@ -164,11 +199,6 @@ class IGzipFile(gzip.GzipFile):
         return '<igzip ' + s[1:-1] + ' ' + hex(id(self)) + '>'
 
     def _write_gzip_header(self, compresslevel=_COMPRESS_LEVEL_TRADEOFF):
-        # Python 3.9 added a `compresslevel` parameter to write gzip header.
-        # This only determines the value of one extra flag. Because this change
-        # was backported to 3.7 and 3.8 in later point versions, the attributes
-        # of the function should be checked before trying to use the
-        # compresslevel parameter.
         # The gzip header has an extra flag that can be set depending on the
         # compression level used. This should be set when either the fastest or
         # best method is used. ISAL level 0 is larger than gzip level 1 and
@@ -176,9 +206,7 @@ class IGzipFile(gzip.GzipFile):
         # ISAL level 1,2 and 3 (best)are similar in size and fall around the
         # gzip level 3 size. So setting no extra flag
         # (by using COMPRESS_LEVEL_TRADEOFF) is appropriate here.
-        if ("compresslevel" in super()._write_gzip_header.__code__.co_varnames
-            and hasattr(gzip, "_COMPRESS_LEVEL_FAST")
-                and hasattr(gzip, "_COMPRESS_LEVEL_TRADEOFF")):
+        if _GZIP_HEADER_HAS_COMPRESSLEVEL:
             if compresslevel == _COMPRESS_LEVEL_FAST:
                 super()._write_gzip_header(gzip._COMPRESS_LEVEL_FAST)
             else:
@@ -200,15 +228,49 @@ class IGzipFile(gzip.GzipFile):
         else:
             # accept any data that supports the buffer protocol
             data = memoryview(data)
+            # Check here, so small (buffered) and large writes raise the same
+            # error that isal_zlib raises for non-contiguous buffers.
+            if not data.c_contiguous:
+                raise BufferError(
+                    "memoryview: underlying buffer is not C-contiguous")
             length = data.nbytes
 
         if length > 0:
-            self.fileobj.write(self.compress.compress(data))
-            self.size += length
-            self.crc = isal_zlib.crc32(data, self.crc)
+            if length >= _WRITE_BUFFER_SIZE:
+                # Large writes are compressed directly, copying them into
+                # the buffer would gain nothing.
+                self._compress_write_buffer()
+                self._compress_data(data, length)
+            else:
+                self._write_buffer += data
+                if len(self._write_buffer) >= _WRITE_BUFFER_SIZE:
+                    self._compress_write_buffer()
             self.offset += length
         return length
 
+    def _compress_data(self, data, length):
+        self.fileobj.write(self.compress.compress(data))
+        self.size += length
+        self.crc = isal_zlib.crc32(data, self.crc)
+
+    def _compress_write_buffer(self):
+        if self._write_buffer:
+            self._compress_data(self._write_buffer, len(self._write_buffer))
+            self._write_buffer = bytearray()
+
+    def flush(self, zlib_mode=isal_zlib.Z_SYNC_FLUSH):
+        self._check_not_closed()
+        if self.mode == gzip.WRITE:
+            self._compress_write_buffer()
+        super().flush(zlib_mode)
+
+    def close(self):
+        try:
+            if self.fileobj is not None and self.mode == gzip.WRITE:
+                self._compress_write_buffer()
+        finally:
+            super().close()
+
 
 class _PaddedFile(gzip._PaddedFile):
     # Overwrite _PaddedFile from gzip as its prepend method assumes that
@@ -235,15 +297,20 @@ class _IGzipReader(gzip._GzipReader):
         # It is not very invasive and allows us to override _PaddedFile
         _compression.DecompressReader.__init__(
             self, _PaddedFile(fp), igzip_lib.decompressobj,
-            hist_bits=igzip_lib.MAX_HIST_BITS, flag=igzip_lib.DECOMP_DEFLATE)
+            hist_bits=igzip_lib.MAX_HIST_BITS,
+            # DECOMP_GZIP_NO_HDR decompresses raw deflate data, but also lets
+            # ISA-L keep track of the crc32 of the output while it is still
+            # in the cache. The gzip header and trailer are still handled by
+            # _GzipReader.
+            flag=igzip_lib.DECOMP_GZIP_NO_HDR)
         # Set flag indicating start of a new member
         self._new_member = True
         self._last_mtime = None
 
     def _add_read_data(self, data):
-        # Use faster isal crc32 calculation and update the stream size in place
-        # compared to CPython gzip
-        self._crc = isal_zlib.crc32(data, self._crc)
+        # The decompressor already calculated the crc32 of all data it has
+        # returned. Update the stream size in place compared to CPython gzip.
+        self._crc = self._decompressor.crc
         self._stream_size += len(data)
 
     def read(self, size=-1):
@@ -290,8 +357,7 @@ class _IGzipReader(gzip._GzipReader):
             if uncompress != b"":
                 break
             if buf == b"":
-                raise EOFError("Compressed file ended before the "
-                               "end-of-stream marker was reached")
+                raise EOFError(_EOF_ERROR_MESSAGE)
 
         self._add_read_data(uncompress)
         self._pos += len(uncompress)
@@ -318,7 +384,7 @@ def _create_simple_gzip_header(compresslevel: int,
     xfl = 4 if compresslevel == _COMPRESS_LEVEL_FAST else 0
     # Pack ID1 and ID2 magic bytes, method (8=deflate), header flags (no extra
     # fields added to header), mtime, xfl and os (255 for unknown OS).
-    return struct.pack("<BBBBLBB", 0x1f, 0x8b, 8, 0, int(mtime), xfl, 255)
+    return _SIMPLE_GZIP_HEADER.pack(0x1f, 0x8b, 8, 0, int(mtime), xfl, 255)
 
 
 def compress(data, compresslevel=_COMPRESS_LEVEL_BEST, *, mtime=None):
@@ -333,43 +399,43 @@ def compress(data, compresslevel=_COMPRESS_LEVEL_BEST, *, mtime=None):
     return header + compressed
 
 
-def _gzip_header_end(data: bytes) -> int:
+def _gzip_header_end(data: bytes, start: int = 0) -> int:
     """
     Find the start of the raw deflate block in a gzip file.
-    :param data: Compressed data that starts with a gzip header.
+    :param data: Compressed data that contains a gzip header at start.
+    :param start: The position of the gzip header in data.
     :return: The end of the header / start of the raw deflate block.
     """
-    eof_error = EOFError("Compressed file ended before the end-of-stream "
-                         "marker was reached")
-    if len(data) < 10:
-        raise eof_error
+    if len(data) < start + 10:
+        raise EOFError(_EOF_ERROR_MESSAGE)
     # We are not interested in mtime, xfl and os flags.
-    magic, method, flags = struct.unpack("<HBB", data[:4])
+    magic, method, flags = _GZIP_HEADER_START.unpack_from(data, start)
     if magic != 0x8b1f:
-        raise BadGzipFile(f"Not a gzipped file ({repr(data[:2])})")
+        raise BadGzipFile(f"Not a gzipped file "
+                          f"({repr(bytes(data[start:start + 2]))})")
     if method != 8:
         raise BadGzipFile("Unknown compression method")
-    pos = 10
+    pos = start + 10
     if flags & FEXTRA:
         if len(data) < pos + 2:
-            raise eof_error
+            raise EOFError(_EOF_ERROR_MESSAGE)
         xlen = int.from_bytes(data[pos: pos + 2], "little", signed=False)
         pos += 2 + xlen
     if flags & FNAME:
         pos = data.find(b"\x00", pos) + 1
         # pos will be -1 + 1 when null byte not found.
         if not pos:
-            raise eof_error
+            raise EOFError(_EOF_ERROR_MESSAGE)
     if flags & FCOMMENT:
         pos = data.find(b"\x00", pos) + 1
         if not pos:
-            raise eof_error
+            raise EOFError(_EOF_ERROR_MESSAGE)
     if flags & FHCRC:
         if len(data) < pos + 2:
-            raise eof_error
+            raise EOFError(_EOF_ERROR_MESSAGE)
         header_crc = int.from_bytes(data[pos: pos + 2], "little", signed=False)
         # CRC is stored as a 16-bit integer by taking last bits of crc32.
-        crc = isal_zlib.crc32(data[:pos]) & 0xFFFF
+        crc = isal_zlib.crc32(data[start:pos]) & 0xFFFF
         if header_crc != crc:
             raise BadGzipFile(f"Corrupted header. Checksums do not "
                               f"match: {crc} != {header_crc}")
@@ -381,25 +447,49 @@ def decompress(data):
     """Decompress a gzip compressed string in one shot.
     Return the decompressed string.
     """
+    if not isinstance(data, (bytes, bytearray)):
+        # The header parsing needs bytes.find.
+        data = bytes(data)
+    # Members are decompressed from a memoryview at the current position,
+    # so the remaining data is not copied for each member.
+    data_view = memoryview(data)
+    data_length = len(data)
+    pos = 0
     all_blocks: List[bytes] = []
-    while True:
-        if data == b"":
-            break
-        header_end = _gzip_header_end(data)
+    # The first member gets all remaining data at once. Usually it is the only
+    # member, and a single decompress call returns all its data without the
+    # need for joining blocks.
+    initial_chunk_size = data_length
+    while pos < data_length:
+        pos = _gzip_header_end(data, pos)
         do = isal_zlib.decompressobj(-15)
-        block = do.decompress(data[header_end:]) + do.flush()
-        if not do.eof or len(do.unused_data) < 8:
-            raise EOFError("Compressed file ended before the end-of-stream "
-                           "marker was reached")
-        checksum, length = struct.unpack("<II", do.unused_data[:8])
-        crc = isal_zlib.crc32(block)
+        crc = 0
+        length = 0
+        # The decompressor copies all input after the end of the member into
+        # unused_data. For later members use doubling chunks, so that copy is
+        # limited to roughly the size of the member rather than the rest of
+        # the data.
+        chunk_size = initial_chunk_size
+        initial_chunk_size = io.DEFAULT_BUFFER_SIZE
+        while not do.eof and pos < data_length:
+            chunk = data_view[pos: pos + chunk_size]
+            block = do.decompress(chunk)
+            pos += len(chunk) - len(do.unused_data)
+            chunk_size *= 2
+            crc = isal_zlib.crc32(block, crc)
+            length += len(block)
+            all_blocks.append(block)
+        if not do.eof or data_length < pos + 8:
+            raise EOFError(_EOF_ERROR_MESSAGE)
+        checksum, isize = _GZIP_TRAILER.unpack_from(data, pos)
+        pos += 8
         if crc != checksum:
             raise BadGzipFile("CRC check failed")
-        if length != len(block):
+        if length != isize:
             raise BadGzipFile("Incorrect length of data produced")
-        all_blocks.append(block)
-        # Remove all padding null bytes and start next block.
-        data = do.unused_data[8:].lstrip(b"\x00")
+        # Skip all padding null bytes and start next block.
+        next_member = _NON_NULL_BYTE.search(data, pos)
+        pos = next_member.start() if next_member else data_length
     return b"".join(all_blocks)
 
 
@@ -247,6 +247,23 @@ def test_decompress_concatenated_with_nulls():
     assert igzip.decompress(data) == DATA + DATA
 
 
+def test_decompress_many_members_with_padding():
+    blocks = [b"member %d\n" % i for i in range(2000)]
+    # Also include a member that is larger than the initial input chunk.
+    blocks[1000] = os.urandom(100_000)
+    # Tape archives pad gzip files to multiples of a block size of several
+    # kilobytes.
+    compressed = b"".join(gzip.compress(block) + b"\x00" * (i % 4 * 2048)
+                          for i, block in enumerate(blocks))
+    assert igzip.decompress(compressed) == b"".join(blocks)
+
+
+@pytest.mark.parametrize("data_type", [bytes, bytearray, memoryview])
+def test_decompress_buffer_types(data_type):
+    compressed = COMPRESSED_DATA + b"\x00" * 10 + COMPRESSED_DATA
+    assert igzip.decompress(data_type(compressed)) == DATA + DATA
+
+
 def test_decompress_missing_trailer():
     with pytest.raises(EOFError) as error:
         igzip.decompress(COMPRESSED_DATA[:-8])
@@ -380,3 +397,62 @@ def test_concatenated_gzip():
     with igzip.open(concat, "rb") as igzip_h:
         result = igzip_h.read()
     assert data == result
+
+
+def test_igzipfile_read_incorrect_checksum():
+    wrong_checksum = zlib.crc32(DATA, 50)
+    wrong_crc_bytes = wrong_checksum.to_bytes(4, "little", signed=False)
+    corrupted_data = (COMPRESSED_DATA[:-8] +
+                      wrong_crc_bytes +
+                      COMPRESSED_DATA[-4:])
+    # The checksum of each member must be checked, not only the first.
+    with igzip.open(io.BytesIO(COMPRESSED_DATA + corrupted_data)) as gzip_h:
+        with pytest.raises(igzip.BadGzipFile) as error:
+            gzip_h.read()
+    error.match("CRC check failed")
+
+
+def test_igzipfile_small_writes():
+    lines = [b"line %d\n" % i for i in range(100_000)]
+    fileobj = io.BytesIO()
+    with igzip.open(fileobj, "wb") as gzip_h:
+        for line in lines:
+            gzip_h.write(line)
+        assert gzip_h.tell() == sum(len(line) for line in lines)
+    assert gzip.decompress(fileobj.getvalue()) == b"".join(lines)
+
+
+def test_igzipfile_flush_writes_buffered_data():
+    fileobj = io.BytesIO()
+    with igzip.open(fileobj, "wb") as gzip_h:
+        gzip_h.write(DATA)
+        gzip_h.flush()
+        # Everything written so far must be decompressable after a flush.
+        decompressor = zlib.decompressobj(wbits=31)
+        assert decompressor.decompress(fileobj.getvalue()) == DATA
+
+
+@pytest.mark.parametrize("size", [10, 1024 * 1024])
+def test_igzipfile_write_non_contiguous(size):
+    data = memoryview(b"x" * size * 2)[::2]
+    with igzip.open(io.BytesIO(), "wb") as gzip_h:
+        with pytest.raises(BufferError) as error:
+            gzip_h.write(data)
+    error.match("not C-contiguous")
+
+
+def test_igzipfile_mixed_small_and_large_writes():
+    blocks = [b"small", bytes(range(256)) * 2048, b"small again",
+              memoryview(b"x" * (1024 * 1024)), b"end"]
+    fileobj = io.BytesIO()
+    with igzip.open(fileobj, "wb") as gzip_h:
+        for block in blocks:
+            gzip_h.write(block)
+    assert gzip.decompress(fileobj.getvalue()) == b"".join(blocks)
+
+
+def test_open_wrong_filename_type():
+    with pytest.raises(TypeError) as error:
+        igzip.open(123.456)
+    error.match("filename must be a str or bytes object, or a file")
+    assert error.value.__suppress_context__